@@ -1,12 +1,60 @@
+import os
+import sys
+import argparse
+import selectors
+import subprocess
+
+
+def run_check_output_script(parent_dirs, target, min_json=100, min_states=99):
+    """
+    调用 check_output.sh 检查 parent_dirs 下的 record/replay 输出。
+    parent_dirs 可以是单个目录字符串或目录列表；多个目录只 fork 一次 bash，
+    把启动开销摊到整批目录上。
+    用 Popen + selectors 交替排空两条管道并边到边转发到本进程的
+    stdout/stderr：既不会双管道死锁，也不在内存里攒完整输出。
+    返回 returncode
+    """
+    if isinstance(parent_dirs, str):
+        parent_dirs = [parent_dirs]
+
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "check_output.sh")
+    cmd = ["bash", script_path, "-t", target,
+           "-j", str(min_json), "-s", str(min_states)]
+    for parent_dir in parent_dirs:
+        cmd.extend(["-p", parent_dir])
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            bufsize=1 << 16)
+
+    # 按 64KB 块轮流排空两条管道，读到就立刻转发，EOF 后注销
+    sinks = {proc.stdout: sys.stdout.buffer, proc.stderr: sys.stderr.buffer}
+    sel = selectors.DefaultSelector()
+    sel.register(proc.stdout, selectors.EVENT_READ)
+    sel.register(proc.stderr, selectors.EVENT_READ)
+    try:
+        while sel.get_map():
+            for key, _ in sel.select():
+                chunk = key.fileobj.read1(1 << 16)
+                if chunk:
+                    sink = sinks[key.fileobj]
+                    sink.write(chunk)
+                    sink.flush()
+                else:
+                    sel.unregister(key.fileobj)
+    finally:
+        sel.close()
+
+    return proc.wait()
 
 
 if __name__ == "__main__":
 
     #参数
     parser = argparse.ArgumentParser()
-    parser.add_argument("--parent_dir", type=str, required=True)
+    parser.add_argument("--parent_dirs", "--parent_dir", type=str, nargs='+', required=True)
     parser.add_argument("--target", type=str, required=True)
     args = parser.parse_args()
 
     #1. 调用的一个例子 ./check_output.sh -t replay -p com.byagowi.persiancalendar/
-    
\ No newline at end of file
+    returncode = run_check_output_script(args.parent_dirs, args.target)
+    print(f"check_output.sh exited with {returncode}")
@@ -9,7 +9,7 @@ usage() {
     echo "用法: $0 [选项]"
     echo "选项:"
     echo "  -t, --target TARGET    目标类型: record 或 replay (默认: replay)"
-    echo "  -p, --parent-dir DIR   父目录路径 (默认: 当前目录)"
+    echo "  -p, --parent-dir DIR   父目录路径，可重复多次批量检查 (默认: 当前目录)"
     echo "  -j, --min-json NUM     events 下最少 json 文件数 (默认: 100)"
     echo "  -s, --min-states NUM   states 下期望的状态数量 (默认: 99)"
     echo "  -h, --help            显示帮助信息"
@@ -18,7 +18,7 @@ usage() {
 
 # 默认值
 TARGET="replay"
-PARENT_DIR=""
+PARENT_DIRS=()
 MIN_JSON=100
 MIN_STATES=99
 
@@ -30,7 +30,7 @@ while [[ $# -gt 0 ]]; do
             shift 2
             ;;
         -p|--parent-dir)
-            PARENT_DIR="$2"
+            PARENT_DIRS+=("$2")
             shift 2
             ;;
         -j|--min-json)
@@ -57,6 +57,21 @@ if [[ "$TARGET" != "record" && "$TARGET" != "replay" ]]; then
     exit 1
 fi
 
+########################################
+# 根据 TARGET 决定前缀
+########################################
+case "$TARGET" in
+  record) PREFIX="record_output_" ;;
+  replay) PREFIX="replay_output_" ;;
+  *) echo "❌ TARGET 只能是 'record' 或 'replay'，当前: $TARGET"; exit 1 ;;
+esac
+
+########################################
+# 检查单个父目录（在子 shell 中调用，cd 不会泄漏）
+########################################
+check_one_dir() {
+local PARENT_DIR="$1"
+
 # 设置工作目录
 if [[ -n "$PARENT_DIR" ]]; then
     if [[ ! -d "$PARENT_DIR" ]]; then
@@ -67,15 +82,6 @@ if [[ -n "$PARENT_DIR" ]]; then
     echo "📁 工作目录: $(pwd)"
 fi
 
-########################################
-# 根据 TARGET 决定前缀
-########################################
-case "$TARGET" in
-  record) PREFIX="record_output_" ;;
-  replay) PREFIX="replay_output_" ;;
-  *) echo "❌ TARGET 只能是 'record' 或 'replay'，当前: $TARGET"; exit 1 ;;
-esac
-
 to_delete=()
 
 # 收集当前目录下所有 ${PREFIX}* 目录
@@ -174,8 +180,8 @@ if ((${#to_delete[@]})); then
   done
   echo ""
   
-  # 用户确认删除
-  read -p "确认删除这些文件夹吗？输入 'yes' 确认: " confirm
+  # 用户确认删除（stdin 非交互/EOF 时按取消处理，不让 read 失败打断批量检查）
+  read -p "确认删除这些文件夹吗？输入 'yes' 确认: " confirm || confirm=""
   if [[ "$confirm" == "yes" ]]; then
     echo "开始删除..."
     for d in "${to_delete[@]}"; do
@@ -193,3 +199,22 @@ if ((${#to_delete[@]})); then
 else
   echo "✅ All ${PREFIX}* folders are valid (events >= $MIN_JSON json, states == $MIN_STATES)."
 fi
+}
+
+########################################
+# 一次调用里批量检查多个父目录，省掉逐目录 fork+exec 的固定开销
+########################################
+if ((${#PARENT_DIRS[@]} == 0)); then
+    PARENT_DIRS=("")
+fi
+
+# 单个目录失败（不存在等）不中断后续目录，最后统一用退出码反映
+FAIL_COUNT=0
+for dir in "${PARENT_DIRS[@]}"; do
+    ( check_one_dir "$dir" ) || FAIL_COUNT=$((FAIL_COUNT + 1))
+done
+
+if (( FAIL_COUNT > 0 )); then
+    echo "⚠ $FAIL_COUNT/${#PARENT_DIRS[@]} 个父目录检查失败"
+    exit 1
+fi
@@ -1,69 +1,166 @@
 import sys
 import argparse
+import bisect
 import os
-import glob
 import csv
-from multiprocessing import Pool, cpu_count
-from droidbot.utils import generate_html_report
+import functools
+import re
+import multiprocessing as mp
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+# POSIX 上显式用 fork 启动 worker：spawn 会在每个 worker 里重新 import 整个模块链，
+# 对这种小中批量的任务，启动开销可能超过任务本身
+_MP_CTX = mp.get_context('fork') if sys.platform != 'win32' else mp.get_context('spawn')
+
+# 可用 CPU 数只在模块加载时取一次；sched_getaffinity 尊重 cgroups/taskset 的限制，
+# 在容器里比 cpu_count 更准确
+try:
+    _NCPU = len(os.sched_getaffinity(0))
+except AttributeError:
+    _NCPU = os.cpu_count() or 1
+
+
+@functools.lru_cache(maxsize=1)
+def _report_generator():
+    """
+    延迟导入 generate_html_report：droidbot.utils 的导入链很重，
+    作为库复用 derive_record_folder/parse_folder_names 时不应该付这笔开销。
+    lru_cache 保证每个进程（含 worker）最多导入一次
+    """
+    from droidbot.utils import generate_html_report
+    return generate_html_report
+
+
+def iter_replay_folders(parent_dir, base_app_filter=None):
+    """
+    逐个产出 parent_dir 下 replay_output_*_for_* 文件夹的 basename。
+    生成器版本：目录再大也只占常量内存，供调用方流式消费。
+    base_app_filter 可以是单个版本号或版本号序列；endswith 接受元组，
+    多版本过滤仍然是对每个条目的一次 C 层调用。
+    """
+    if base_app_filter is None:
+        suffix = None
+    elif isinstance(base_app_filter, str):
+        suffix = f"_for_{base_app_filter}"
+    else:
+        suffix = tuple(f"_for_{version}" for version in base_app_filter)
+    try:
+        entries = os.scandir(parent_dir)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            name = entry.name
+            # 前缀+子串判断替代 fnmatch：模式是固定的，不需要每个条目走通配符匹配
+            if not name.startswith("replay_output_") or "_for_" not in name:
+                continue
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            if suffix and not name.endswith(suffix):
+                continue
+            yield name
 
 
 def find_replay_folders(parent_dir, base_app_filter=None):
     """
-    在 parent_dir 下查找所有 replay_output_*_for_* 文件夹。
-    如果提供 base_app_filter（例如 "3_8_0"），则仅返回 *_for_{base_app_filter} 的目录。
+    在 parent_dir 下查找所有 replay_output_*_for_* 文件夹，返回 basename 列表。
+    如果提供 base_app_filter（例如 "3_8_0"，或多个版本号的序列），
+    则仅返回 *_for_{base_app_filter} 的目录。
     """
-    pattern = os.path.join(parent_dir, "replay_output_*_for_*")
-    replay_folders = glob.glob(pattern)
+    return list(iter_replay_folders(parent_dir, base_app_filter=base_app_filter))
 
-    if base_app_filter:
-        suffix = f"_for_{base_app_filter}"
-        replay_folders = [p for p in replay_folders if os.path.basename(p).endswith(suffix)]
 
-    return replay_folders
+@functools.lru_cache(maxsize=None)
+def _record_folder_index(parent_dir):
+    """
+    扫描一次 parent_dir，建立 record 文件夹索引，避免每个 replay 都 glob 一遍。
+    返回 (exact, fallback)：
+      - exact: {(version, run_count): folder_name} 精确匹配
+      - fallback: {version: folder_name} 任意 run 的回退匹配
+    """
+    exact = {}
+    fallback = {}
+    # 只需要名字，不取任何元数据：listdir 比 scandir 少一层 DirEntry 对象分配
+    try:
+        names = os.listdir(parent_dir)
+    except OSError:
+        return exact, fallback
+    for name in names:
+        if not name.startswith("record_output_") or "_run" not in name:
+            continue
+        version, _, run = name[len("record_output_"):].rpartition("_run")
+        exact[(version, run)] = name
+        fallback.setdefault(version, name)
+    return exact, fallback
+
+
+@functools.lru_cache(maxsize=None)
+def _dir_entries(parent_dir):
+    """缓存 parent_dir 的目录项集合，把逐个 os.path.exists 的 stat 调用变成 O(1) 集合查找"""
+    try:
+        return frozenset(os.listdir(parent_dir))
+    except OSError:
+        return frozenset()
+
 
+def _refresh_dir_caches():
+    """批次入口调用：清掉目录索引缓存，保证每个批次只扫一次、且扫到的是最新状态"""
+    _record_folder_index.cache_clear()
+    _dir_entries.cache_clear()
+    derive_record_folder.cache_clear()
 
+
+@functools.lru_cache(maxsize=None)
 def derive_record_folder(replay_folder_name, parent_dir):
     """
     根据 replay 文件夹名推导对应的 record 文件夹名，并在 parent_dir 下查找。
     例：replay_output_6_3_0_run3_for_4_7_2 -> record_output_4_7_2_run3
     返回：basename（例如 record_output_4_7_2_run3）或 None
+    记忆化（含查不到的负缓存）：共享同一 target/run 的 replay 不重复解析和查索引
     """
-    if "_for_" not in replay_folder_name:
+    # 复用 parse_folder_names：同一个名字只走一次解析逻辑
+    folder_info = parse_folder_names(replay_folder_name)
+    target_version = folder_info['base_app']
+    if target_version == "unknown":
         return None
 
-    parts = replay_folder_name.split("_for_")
-    if len(parts) != 2:
-        return None
+    run_count = folder_info['run_count']
+    if run_count == "unknown":
+        run_count = None
+
+    exact, fallback = _record_folder_index(parent_dir)
 
-    target_version = parts[1]
-    base_part = parts[0]
-    
-    # 提取run_count
-    run_count = None
-    if "_run" in base_part:
-        run_parts = base_part.split("_run")
-        if len(run_parts) == 2:
-            run_count = run_parts[1]
-    
     # 如果找到了run_count，尝试精确匹配
-    if run_count:
-        record_pattern = os.path.join(parent_dir, f"record_output_{target_version}_run{run_count}")
-        if os.path.exists(record_pattern):
-            return os.path.basename(record_pattern)
-    
+    if run_count and (target_version, run_count) in exact:
+        return exact[(target_version, run_count)]
+
     # 如果精确匹配失败，回退到通配符匹配（保持向后兼容）
-    record_pattern = os.path.join(parent_dir, f"record_output_{target_version}_run*")
-    record_folders = glob.glob(record_pattern)
-    if record_folders:
-        return os.path.basename(record_folders[0])
-    return None
+    return fallback.get(target_version)
 
 
 def generate_report_name(replay_folder_name):
-    """replay_output_* → report_output_*（仅替换首个 'replay_'）"""
+    """replay_output_* → report_output_*（仅替换开头的 'replay_'）"""
+    if replay_folder_name.startswith("replay_"):
+        return "report_" + replay_folder_name[len("replay_"):]
     return replay_folder_name.replace("replay_", "report_", 1)
 
 
+# analysis.csv 的列顺序（结果 dict 的固定读取顺序）
+_ANALYSIS_FIELDS = (
+    'base_app', 'run_count', 'target_app',
+    'replay_dir', 'record_dir', 'report_dir',
+    'events_json_count', 'failure_stage', 'status', 'note'
+)
+
+# replay 文件夹名的解析正则：一次匹配同时完成形状校验并取出 target_app / run_count / base_app；
+# run 限定为数字，名字不合形状时走 parse_folder_names 的 fallback
+_REPLAY_NAME_RE = re.compile(r'^replay_output_(?P<target>.+?)_run(?P<run>\d+)_for_(?P<base>.+)$')
+
+# 下划线版本号 → 点号版本号的转换表（translate 比单字符 replace 更快）
+_UND_TO_DOT = str.maketrans('_', '.')
+
+
 def parse_folder_names(replay_folder_name):
     """
     解析 {base_app}, {run_count}, {target_app}
@@ -73,42 +170,57 @@ def parse_folder_names(replay_folder_name):
     - base_app: v6_4_1 (在_for_后面)
     - run_count: 1 (在_run后面)
     """
-    base_app = "unknown"
-    target_app = "unknown"
-    run_count = "unknown"
+    # 单次正则匹配替代 split("_for_") + split("_run") 的多趟扫描
+    m = _REPLAY_NAME_RE.match(replay_folder_name)
+    if m:
+        return {
+            'base_app': m.group('base'),
+            'run_count': m.group('run'),
+            'target_app': m.group('target')
+        }
 
-    # replay_folder_name: replay_output_v9_6_0_run1_for_v6_4_1
-    # 按 "_for_" 分割
+    # 不符合完整格式时保持旧行为：能解析出 base_app 就给出，其余标 unknown
+    base_app = "unknown"
     replay_parts = replay_folder_name.split("_for_")
     if len(replay_parts) == 2:
-        # base_app 是 _for_ 后面的部分
         base_app = replay_parts[1]
-        
-        # target_app 和 run_count 在 _for_ 前面的部分
-        target_part = replay_parts[0].replace("replay_output_", "")
-        # 按 "_run" 分割
-        target_parts = target_part.split("_run")
-        if len(target_parts) == 2:
-            target_app = target_parts[0]
-            run_count = target_parts[1]
 
     return {
         'base_app': base_app,
-        'run_count': run_count,
-        'target_app': target_app
+        'run_count': "unknown",
+        'target_app': "unknown"
     }
 
 
-def count_replay_events_json(replay_dir):
+def count_replay_events_json(replay_dir, cap=None):
     """
     统计 replay_dir/events 目录下的 .json 数量。
+    cap 非空时数到 cap 即停：调用方只关心是否达到阈值（如 100）时，
+    不必为几千个文件的目录扫到底。
     返回 (count, events_dir_exists)
     """
-    events_dir = os.path.join(replay_dir, "events")
-    if not os.path.isdir(events_dir):
+    # 热路径：f-string 拼接比 os.path.join 的规范化逻辑快（本工具只跑在 POSIX 上）
+    events_dir = f"{replay_dir}/events"
+    try:
+        entries = os.scandir(events_dir)
+    except OSError:
         return 0, False
-    json_paths = glob.glob(os.path.join(events_dir, "*.json"))
-    return len(json_paths), True
+    # 直接 scandir + endswith 计数，避免 glob 的 fnmatch 和逐项 stat 开销；
+    # 跳过隐藏文件（如 macOS 拷贝产生的 ._xxx.json），它们不是真实事件
+    count = 0
+    with entries:
+        for entry in entries:
+            name = entry.name
+            if name.endswith(".json") and not name.startswith(".") and entry.is_file(follow_symlinks=False):
+                count += 1
+                if cap is not None and count >= cap:
+                    break
+    return count, True
+
+
+# classify_failure_stage 的区间上界与对应阶段名（bisect_right 直接落在正确的桶里）
+_STAGE_BINS = (1, 10, 50, 100)
+_STAGE_NAMES = ("launcher_failed", "very_early", "early", "mid", "complete")
 
 
 def classify_failure_stage(json_count, events_dir_exists):
@@ -123,158 +235,133 @@ def classify_failure_stage(json_count, events_dir_exists):
     """
     if not events_dir_exists:
         return "no_events_dir"
-    if json_count == 0:
-        return "launcher_failed"
-    if json_count < 10:
-        return "very_early"
-    if json_count < 50:
-        return "early"
-    if json_count < 100:
-        return "mid"
-    return "complete"
+    # bisect 查表替代 if/elif 级联：每个 replay 都会走到这里，区间边界见上
+    return _STAGE_NAMES[bisect.bisect_right(_STAGE_BINS, json_count)]
 
 
-def process_single_replay(args):
+def classify_replay(args):
     """
-    处理单个replay文件夹的函数，用于并行处理
+    在主进程里做便宜的文件系统检查与分类，返回 (result, needs_processing)。
+    needs_processing=False 时 result 已是完整的结果行（skip/error/test_mode 快路径）；
+    True 时 result 缺 status/note，由 run_report 在 worker 里补全。
+    便宜任务不进 worker，省掉为它们 pickle 参数/结果的开销。
     """
     (replay_folder, parent_dir, test_mode) = args
+    # 现在传入的是 basename；保留 basename 兼容旧的全路径调用方式
     replay_name = os.path.basename(replay_folder)
-    
-    # 推导 record
+    replay_path = f"{parent_dir}/{replay_name}"
+
+    # 解析信息：每个文件夹只解析一次，后续分支通过 base_result 复用
+    folder_info = parse_folder_names(replay_name)
+    base_result = {
+        'base_app': folder_info['base_app'],
+        'run_count': folder_info['run_count'],
+        'target_app': folder_info['target_app'],
+        'replay_dir': replay_name,
+        'record_dir': '',
+        'report_dir': '',
+        'events_json_count': 0,
+        'failure_stage': 'unknown',
+    }
+
+    # 推导 record：索引本身就来自对 parent_dir 的扫描，查得到即存在，
+    # 不需要再对 record 路径做一次存在性检查
     record_name = derive_record_folder(replay_name, parent_dir)
     if not record_name:
-        return {
-            'base_app': parse_folder_names(replay_name).get('base_app'),
-            'run_count': parse_folder_names(replay_name).get('run_count'),
-            'target_app': parse_folder_names(replay_name).get('target_app'),
-            'replay_dir': replay_name,
-            'record_dir': '',
-            'report_dir': '',
-            'events_json_count': 0,
-            'failure_stage': 'unknown',
-            'status': 'error',
-            'note': 'record_not_found_or_unparsable'
-        }
-    
-    record_path = os.path.join(parent_dir, record_name)
-    if not os.path.exists(record_path):
-        events_count, events_dir_exists = count_replay_events_json(replay_folder)
-        failure_stage = classify_failure_stage(events_count, events_dir_exists)
-        return {
-            'base_app': parse_folder_names(replay_name).get('base_app'),
-            'run_count': parse_folder_names(replay_name).get('run_count'),
-            'target_app': parse_folder_names(replay_name).get('target_app'),
-            'replay_dir': replay_name,
-            'record_dir': record_name,
-            'report_dir': '',
-            'events_json_count': events_count,
-            'failure_stage': failure_stage,
-            'status': 'error',
-            'note': 'record_missing_on_disk'
-        }
-    
+        events_count, events_dir_exists = count_replay_events_json(replay_path, cap=100)
+        base_result['events_json_count'] = events_count
+        base_result['failure_stage'] = classify_failure_stage(events_count, events_dir_exists)
+        return {**base_result, 'status': 'error', 'note': 'record_not_found_or_unparsable'}, False
+
+    base_result['record_dir'] = record_name
+
     # 生成报告目录名
     report_name = generate_report_name(replay_name)
-    report_path = os.path.join(parent_dir, report_name)
-    
-    # 解析信息
-    folder_info = parse_folder_names(replay_name)
-    
+    base_result['report_dir'] = report_name
+
+    # 已存在报告 → 直接跳过：放在 events 扫描之前，
+    # 已处理过的文件夹只花名字解析 + 集合查找的代价，不再扫它的 events 目录
+    if report_name in _dir_entries(parent_dir):
+        return {**base_result, 'status': 'skipped', 'note': 'report_exists'}, False
+
     # 统计 events/*.json
-    events_count, events_dir_exists = count_replay_events_json(replay_folder)
-    failure_stage = classify_failure_stage(events_count, events_dir_exists)
-    
+    # 分类只看“是否达到 100”，数满 100 即止，CSV 里 100 表示 >=100
+    events_count, events_dir_exists = count_replay_events_json(replay_path, cap=100)
+    base_result['events_json_count'] = events_count
+    base_result['failure_stage'] = classify_failure_stage(events_count, events_dir_exists)
+
     # 检查是否达到100个events（表示测试完成）→ 跳过生成
     if events_count >= 100:
-        return {
-            'base_app': folder_info['base_app'],
-            'run_count': folder_info['run_count'],
-            'target_app': folder_info['target_app'],
-            'replay_dir': replay_name,
-            'record_dir': record_name,
-            'report_dir': report_name,
-            'events_json_count': events_count,
-            'failure_stage': failure_stage,
-            'status': 'skipped',
-            'note': 'test_completed_100_events'
-        }
-    
-    # 已存在报告 → 跳过生成
-    if os.path.exists(report_path):
-        return {
-            'base_app': folder_info['base_app'],
-            'run_count': folder_info['run_count'],
-            'target_app': folder_info['target_app'],
-            'replay_dir': replay_name,
-            'record_dir': record_name,
-            'report_dir': report_name,
-            'events_json_count': events_count,
-            'failure_stage': failure_stage,
-            'status': 'skipped',
-            'note': 'report_exists'
-        }
-    
-    # 生成报告
-    record_path_abs = os.path.abspath(record_path)
-    replay_folder_abs = os.path.abspath(replay_folder)
-    report_path_abs = os.path.abspath(report_path)
-    
+        return {**base_result, 'status': 'skipped', 'note': 'test_completed_100_events'}, False
+
     if test_mode:
         # 测试模式：不实际执行
-        return {
-            'base_app': folder_info['base_app'],
-            'run_count': folder_info['run_count'],
-            'target_app': folder_info['target_app'],
-            'replay_dir': replay_name,
-            'record_dir': record_name,
-            'report_dir': report_name,
-            'events_json_count': events_count,
-            'failure_stage': failure_stage,
-            'status': 'test_mode',
-            'note': 'test_mode_execution'
-        }
-    else:
-        # 正常模式：实际执行
-        try:
-            result = generate_html_report(record_path_abs, replay_folder_abs, report_path_abs)
-            return {
-                'base_app': folder_info['base_app'],
-                'run_count': folder_info['run_count'],
-                'target_app': folder_info['target_app'],
-                'replay_dir': replay_name,
-                'record_dir': record_name,
-                'report_dir': report_name,
-                'events_json_count': events_count,
-                'failure_stage': failure_stage,
-                'status': 'processed',
-                'note': ''
-            }
-        except Exception as e:
-            return {
-                'base_app': folder_info['base_app'],
-                'run_count': folder_info['run_count'],
-                'target_app': folder_info['target_app'],
-                'replay_dir': replay_name,
-                'record_dir': record_name,
-                'report_dir': report_name,
-                'events_json_count': events_count,
-                'failure_stage': failure_stage,
-                'status': 'error',
-                'note': f'exception: {e}'
-            }
-
-
-def batch_analysis(parent_dir, base_app_filter=None, test_mode=False, parallel=False, max_workers=None):
-    """在 parent_dir 下批量分析，按 base_app_filter（可选）过滤"""
+        return {**base_result, 'status': 'test_mode', 'note': 'test_mode_execution'}, False
+
+    return base_result, True
+
+
+_WORKER_CTX = {}
+
+
+def _init_worker(parent_dir):
+    """Pool/Executor initializer：每个 worker 进程只接收一次 parent_dir，
+    任务元组里不再重复携带（record/report 索引只在主进程分类阶段用，不需要下发）"""
+    _WORKER_CTX['parent_dir'] = parent_dir
+
+
+def run_report(args):
+    """
+    worker 端：只负责真正的 generate_html_report 调用。
+    parent_dir 在批次入口已归一化为绝对路径，join 出来的路径本身就是绝对路径
+    """
+    (replay_name, base_result) = args
+    parent_dir = _WORKER_CTX['parent_dir']
+    record_path = f"{parent_dir}/{base_result['record_dir']}"
+    replay_path = f"{parent_dir}/{replay_name}"
+    report_path = f"{parent_dir}/{base_result['report_dir']}"
+    try:
+        _report_generator()(record_path, replay_path, report_path)
+        return {**base_result, 'status': 'processed', 'note': ''}
+    except Exception as e:
+        return {**base_result, 'status': 'error', 'note': f'exception: {e}'}
+
+
+def process_single_replay(args):
+    """
+    处理单个replay文件夹的函数（分类 + 生成），串行路径和旧调用方继续使用
+    """
+    result, needs_processing = classify_replay(args)
+    if not needs_processing:
+        return result
+    (replay_folder, parent_dir, test_mode) = args
+    _init_worker(parent_dir)
+    return run_report((os.path.basename(replay_folder), result))
+
+
+def batch_analysis(parent_dir, base_app_filter=None, test_mode=False, parallel=False, max_workers=None,
+                   io_threads=None):
+    """在 parent_dir 下批量分析，按 base_app_filter（可选）过滤。
+    io_threads 指定时用线程池代替进程池：generate_html_report 以读 JSON/写
+    HTML/拷图片等 I/O 为主时，线程即可重叠 I/O，还省掉 fork 和 pickle 的开销。
+    """
+    # 只在入口归一化一次，后续路径拼接直接得到绝对路径；
+    # main() 已经传绝对路径进来，已绝对时不再付 getcwd+normpath 的代价
+    if not os.path.isabs(parent_dir):
+        parent_dir = os.path.abspath(parent_dir)
+    _refresh_dir_caches()
     print("Starting batch analysis...")
     print(f"Parent dir: {parent_dir}")
     if base_app_filter:
         print(f"Base app filter: {base_app_filter}")
     if test_mode:
         print("🧪 TEST MODE: Will show commands instead of executing them")
-    if parallel:
-        workers = max_workers if max_workers else min(cpu_count(), 4)  # 默认最多4个进程
+    if io_threads:
+        parallel = True
+        workers = io_threads
+        print(f"🚀 IO-THREAD MODE: Using {workers} threads")
+    elif parallel:
+        workers = max_workers if max_workers else min(_NCPU, 4)  # 默认最多4个进程
         print(f"🚀 PARALLEL MODE: Using {workers} workers")
 
     # 查找 replay
@@ -285,75 +372,126 @@ def batch_analysis(parent_dir, base_app_filter=None, test_mode=False, parallel=F
         return
 
     print(f"Found {len(replay_folders)} replay folders:")
-    for folder in replay_folders:
-        print(f"  - {os.path.basename(folder)}")
+    for replay_name in replay_folders:
+        print(f"  - {replay_name}")
 
     # 准备参数
     process_args = [(replay_folder, parent_dir, test_mode) for replay_folder in replay_folders]
 
-    if parallel and not test_mode:
-        # 并行处理
-        print(f"\n🚀 Processing {len(replay_folders)} folders in parallel...")
-        with Pool(processes=workers) as pool:
-            analysis_results = pool.map(process_single_replay, process_args)
-    else:
-        # 串行处理（测试模式或非并行模式）
-        print(f"\n🔄 Processing {len(replay_folders)} folders sequentially...")
-        analysis_results = []
-        for i, args in enumerate(process_args, 1):
-            replay_folder, parent_dir, test_mode = args
-            replay_name = os.path.basename(replay_folder)
-            
-            if test_mode:
-                print(f"[{i}/{len(process_args)}] 🧪 Testing {replay_name}")
-            else:
-                print(f"[{i}/{len(process_args)}] 🔄 Processing {replay_name}")
-            
-            result = process_single_replay(args)
-            analysis_results.append(result)
-            
-            # 在测试模式下显示详细信息
-            if test_mode and result['status'] == 'test_mode':
-                print(f"   🧪 TEST MODE - Would execute:")
-                print(f"      Python command: python -c \"from droidbot.utils import generate_html_report; generate_html_report('...', '...', '...')\"")
-                print(f"      Arguments:")
-                print(f"        - replay: {result['replay_dir']}")
-                print(f"        - record: {result['record_dir']}")
-                print(f"        - events count: {result['events_json_count']}")
-                print(f"        - would skip (≥100 events): {'✅ YES' if result['events_json_count'] >= 100 else '❌ NO'}")
-
-    # 统计结果
-    processed_count = sum(1 for r in analysis_results if r['status'] == 'processed')
-    skipped_count = sum(1 for r in analysis_results if r['status'] == 'skipped')
-    error_count = sum(1 for r in analysis_results if r['status'] == 'error')
-    test_mode_count = sum(1 for r in analysis_results if r['status'] == 'test_mode')
-
-    # 生成 CSV（放在 parent_dir 下）
+    # 生成 CSV（放在 parent_dir 下）：边处理边写入，长批次中途被杀也能保留已完成的记录。
+    # 依赖默认块缓冲批量落盘，循环内不做 flush/fsync
     csv_filename = os.path.join(parent_dir, "analysis.csv")
+    # 结果不再整批留在内存里：行写进 CSV 后只保留状态计数，峰值内存 O(1)
+    status_totals = Counter()
     try:
-        with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = [
-                'base_app', 'run_count', 'target_app',
-                'replay_dir', 'record_dir', 'report_dir',
-                'events_json_count', 'failure_stage', 'status', 'note'
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for result in analysis_results:
-                writer.writerow(result)
+        with open(csv_filename, 'w', newline='', encoding='utf-8', buffering=1 << 16) as csvfile:
+            # 固定列顺序 + 普通 csv.writer：省掉 DictWriter 每行的字段名查找/重排
+            writer = csv.writer(csvfile)
+            writer.writerow(_ANALYSIS_FIELDS)
+
+            def write_result(result):
+                writer.writerow([result[k] for k in _ANALYSIS_FIELDS])
+
+            if parallel and not test_mode:
+                # 先在主进程把所有便宜的 skip/error 快路径分类掉，
+                # 只有真正要调用 generate_html_report 的任务才派发给 worker
+                todo_args = []
+                for args in process_args:
+                    result, needs_processing = classify_replay(args)
+                    if needs_processing:
+                        todo_args.append((os.path.basename(args[0]), result))
+                    else:
+                        status_totals[result['status']] += 1
+                        write_result(result)
+                if len(todo_args) < len(process_args):
+                    print(f"\n⏭️  {len(process_args) - len(todo_args)} folders classified serially (skip/error fast paths)")
+
+                # 小批量不值得起进程池：worker 启动 + 每任务 pickle 的固定开销会盖过并行收益
+                # （线程池启动近乎免费，不做该回退）
+                if not io_threads and len(todo_args) < max(2 * workers, 8):
+                    print(f"\n⏭️  Small batch ({len(todo_args)} report tasks) — running serially to avoid pool startup overhead")
+                    _init_worker(parent_dir)
+                    for args in todo_args:
+                        result = run_report(args)
+                        status_totals[result['status']] += 1
+                        write_result(result)
+                    todo_args = []
+
+                # 并行处理：有界提交窗口（2×workers），in-flight 任务数与输入规模无关，
+                # 完成一个就补一个，结果流式收集，避免被单个慢文件夹阻塞
+                if todo_args:
+                    print(f"\n🚀 Processing {len(todo_args)} folders in parallel...")
+                    if io_threads:
+                        # 线程共享本进程，初始化一次 worker 上下文即可
+                        _init_worker(parent_dir)
+                        executor_cm = ThreadPoolExecutor(max_workers=workers)
+                    else:
+                        executor_cm = ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CTX,
+                                                          initializer=_init_worker, initargs=(parent_dir,))
+                    with executor_cm as executor:
+                        todo_iter = iter(todo_args)
+                        max_inflight = workers * 2
+                        pending = set()
+                        while True:
+                            for args in todo_iter:
+                                pending.add(executor.submit(run_report, args))
+                                if len(pending) >= max_inflight:
+                                    break
+                            if not pending:
+                                break
+                            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in finished:
+                                result = future.result()
+                                status_totals[result['status']] += 1
+                                write_result(result)
+            else:
+                # 串行处理（测试模式或非并行模式）
+                print(f"\n🔄 Processing {len(replay_folders)} folders sequentially...")
+                for i, args in enumerate(process_args, 1):
+                    replay_name, parent_dir, test_mode = args
+
+                    if test_mode:
+                        print(f"[{i}/{len(process_args)}] 🧪 Testing {replay_name}")
+                    else:
+                        print(f"[{i}/{len(process_args)}] 🔄 Processing {replay_name}")
+
+                    result = process_single_replay(args)
+                    status_totals[result['status']] += 1
+                    write_result(result)
+
+                    # 在测试模式下显示详细信息
+                    if test_mode and result['status'] == 'test_mode':
+                        print(f"   🧪 TEST MODE - Would execute:")
+                        print(f"      Python command: python -c \"from droidbot.utils import generate_html_report; generate_html_report('...', '...', '...')\"")
+                        print(f"      Arguments:")
+                        print(f"        - replay: {result['replay_dir']}")
+                        print(f"        - record: {result['record_dir']}")
+                        print(f"        - events count: {result['events_json_count']}")
+                        print(f"        - would skip (≥100 events): {'✅ YES' if result['events_json_count'] >= 100 else '❌ NO'}")
 
         print(f"\n📊 CSV report generated: {csv_filename}")
-        print(f"   - Total records: {len(analysis_results)}")
+        print(f"   - Total records: {sum(status_totals.values())}")
     except Exception as e:
         print(f"❌ Error generating CSV: {e}")
 
-    print(f"\nBatch analysis completed:")
-    print(f"  - Processed: {processed_count}")
-    print(f"  - Skipped: {skipped_count}")
-    print(f"  - Errors: {error_count}")
+    # 统计结果
+    processed_count = status_totals['processed']
+    skipped_count = status_totals['skipped']
+    error_count = status_totals['error']
+    test_mode_count = status_totals['test_mode']
+
+    # 汇总一次性写出：N 次 print（每次一个 write 系统调用）→ 1 次 write
+    summary_lines = [
+        "",
+        "Batch analysis completed:",
+        f"  - Processed: {processed_count}",
+        f"  - Skipped: {skipped_count}",
+        f"  - Errors: {error_count}",
+    ]
     if test_mode:
-        print(f"  - Test mode: {test_mode_count}")
-    print(f"  - Total: {len(replay_folders)}")
+        summary_lines.append(f"  - Test mode: {test_mode_count}")
+    summary_lines.append(f"  - Total: {len(replay_folders)}")
+    sys.stdout.write('\n'.join(summary_lines) + '\n')
 
 
 def main():
@@ -363,6 +501,9 @@ def main():
     parser.add_argument('--parallel', action='store_true', help='Enable parallel processing for batch mode (faster but uses more CPU)')
     parser.add_argument('--max-workers', type=int, default=None,
                         help='Maximum number of parallel workers (default: min(CPU cores, 4))')
+    parser.add_argument('--io-threads', type=int, default=None,
+                        help='Use a thread pool of N threads instead of processes for batch mode '
+                             '(pick this when generate_html_report is I/O-bound; --parallel is for CPU-bound rendering)')
     parser.add_argument('--deduplicate', action='store_true', help='Enable deduplication mode to find unique test cases')
     parser.add_argument('--run-count', default=None, help='Filter by specific run count for deduplication (e.g., "1")')
     parser.add_argument('--parent-dir', default=os.getcwd(),
@@ -427,8 +568,8 @@ def main():
                 generate_deduplicated_reports(deduplicated_results, parent_dir, args.parallel, args.max_workers)
         else:
             # 正常batch模式
-            batch_analysis(parent_dir=parent_dir, base_app_filter=args.base_app, test_mode=args.test_mode, 
-                          parallel=args.parallel, max_workers=args.max_workers)
+            batch_analysis(parent_dir=parent_dir, base_app_filter=args.base_app, test_mode=args.test_mode,
+                          parallel=args.parallel, max_workers=args.max_workers, io_threads=args.io_threads)
     else:
         # 单个报告生成（保持向后兼容）
         if not args.output_dir:
@@ -445,7 +586,7 @@ def main():
             stage = classify_failure_stage(events_count, events_dir_exists)
             print(f"[Single] events_json_count={events_count}, failure_stage={stage}")
 
-        result = generate_html_report(output_dir, replay_output_dir, out_dir)
+        result = _report_generator()(output_dir, replay_output_dir, out_dir)
         print(f"Report generated successfully: {result}")
 
 
@@ -498,6 +639,7 @@ def de_duplicate_case(parent_dir, base_app_filter=None, run_count_filter=None):
     events_json_count: 51, 49, 49, 32, 7, 7
     结果：需要生成报告的target app序号是1,2,4,5 (第一个不相同的events_json_count)
     """
+    _refresh_dir_caches()
     print("🔍 Starting deduplication analysis...")
     print(f"Parent dir: {parent_dir}")
     if base_app_filter:
@@ -523,34 +665,34 @@ def de_duplicate_case(parent_dir, base_app_filter=None, run_count_filter=None):
         return []
     
     # 第三步：按base_app和run_count分组，并按CSV版本顺序排序
-    groups = {}
-    for replay_folder in replay_folders:
-        replay_name = os.path.basename(replay_folder)
+    # 先过滤出需要处理的文件夹
+    filtered = []
+    for replay_name in replay_folders:
         folder_info = parse_folder_names(replay_name)
-        
-        base_app = folder_info['base_app']
-        run_count = folder_info['run_count']
-        target_app = folder_info['target_app']
 
         # 如果指定了run_count_filter，只处理匹配的（默认处理所有run count）
-        if run_count_filter and str(run_count) != str(run_count_filter):
+        if run_count_filter and str(folder_info['run_count']) != str(run_count_filter):
             continue
-            
+
         # 如果指定了base_app_filter，只处理匹配的
-        if base_app_filter and base_app != base_app_filter:
+        if base_app_filter and folder_info['base_app'] != base_app_filter:
             continue
-        
-        key = f"{base_app}_run{run_count}"
-        if key not in groups:
-            groups[key] = []
-        
-        # 统计events数量
-        events_count, events_dir_exists = count_replay_events_json(replay_folder)
-        
-        groups[key].append({
+
+        filtered.append((replay_name, f"{parent_dir}/{replay_name}", folder_info))
+
+    # events 统计是纯目录 I/O（scandir 释放 GIL），用线程池并发重叠 stat 调用
+    if filtered:
+        with ThreadPoolExecutor(max_workers=min(32, len(filtered))) as ex:
+            counts = list(ex.map(count_replay_events_json, (folder for _, folder, _ in filtered)))
+    else:
+        counts = []
+
+    groups = defaultdict(list)
+    for (replay_name, replay_folder, folder_info), (events_count, events_dir_exists) in zip(filtered, counts):
+        groups[f"{folder_info['base_app']}_run{folder_info['run_count']}"].append({
             'replay_folder': replay_folder,
             'replay_name': replay_name,
-            'target_app': target_app,
+            'target_app': folder_info['target_app'],
             'events_count': events_count,
             'events_dir_exists': events_dir_exists,
             'failure_stage': classify_failure_stage(events_count, events_dir_exists)
@@ -562,24 +704,20 @@ def de_duplicate_case(parent_dir, base_app_filter=None, run_count_filter=None):
     
     # 第四步：对每个组进行去重分析
     deduplicated_results = []
-    
+
+    # 版本顺序做成 dict：排序 key 从 O(M) 的 list.index 变成 O(1) 查找
+    version_rank = {v: i for i, v in enumerate(csv_versions)}
+    fallback_rank = len(csv_versions)  # 不在CSV中的版本放到最后
+
     for group_key, items in groups.items():
         print(f"\n📊 Analyzing group: {group_key}")
 
-        # print(f"CSV versions: {csv_versions}")
-        
         # 按CSV中的版本顺序排序
         def get_version_order(item):
-            target_app = item['target_app']
             # 逆向sanitize_suffix：将下划线版本转换为点号版本进行匹配
             # 例如：v9_9_1 → v9.9.1
-            target_app_dots = target_app.replace('_', '.')
-            try:
-                return csv_versions.index(target_app_dots)
-            except ValueError:
-                # 如果版本不在CSV中，放到最后
-                return len(csv_versions)
-        
+            return version_rank.get(item['target_app'].translate(_UND_TO_DOT), fallback_rank)
+
         items.sort(key=get_version_order)
         
         print(f"Target apps in CSV order: {[item['target_app'] for item in items]}")
@@ -624,93 +762,61 @@ def de_duplicate_case(parent_dir, base_app_filter=None, run_count_filter=None):
 
 def generate_deduplicated_reports(deduplicated_results, parent_dir, parallel=False, max_workers=None):
     """
-    为去重后的结果生成HTML报告
+    为去重后的结果生成HTML报告：复用 batch 模式的 classify_replay/run_report 管线，
+    存在性检查、跳过逻辑不再单独维护一份
     """
+    if not os.path.isabs(parent_dir):
+        parent_dir = os.path.abspath(parent_dir)
+    _refresh_dir_caches()
     print(f"🔄 Generating HTML reports for {len(deduplicated_results)} unique cases...")
-    
+
     if parallel:
-        workers = max_workers if max_workers else min(cpu_count(), 4)
+        workers = max_workers if max_workers else min(_NCPU, 4)
         print(f"🚀 PARALLEL MODE: Using {workers} workers")
-    
-    # 准备参数
-    process_args = []
+
+    # 先在主进程走快路径分类，只有真正要生成报告的任务才进 worker
+    todo_args = []
+    precheck_errors = 0
     for result in deduplicated_results:
-        replay_folder = result['replay_folder']
         replay_name = result['replay_name']
-        
-        # 推导record文件夹
-        record_name = derive_record_folder(replay_name, parent_dir)
-        if not record_name:
-            print(f"⚠️  Could not derive record folder for {replay_name}")
-            continue
-            
-        record_path = os.path.join(parent_dir, record_name)
-        if not os.path.exists(record_path):
-            print(f"⚠️  Record folder not found: {record_name}")
-            continue
-        
-        # 生成报告目录名
-        report_name = generate_report_name(replay_name)
-        report_path = os.path.join(parent_dir, report_name)
-        
-        # 检查是否已存在报告
-        if os.path.exists(report_path):
-            print(f"⏭️  Skipping {replay_name} - report already exists: {report_name}")
-            continue
-        
-        process_args.append((replay_folder, record_path, report_path))
-    
-    if not process_args:
+        row, needs_processing = classify_replay((replay_name, parent_dir, False))
+        if needs_processing:
+            todo_args.append((replay_name, row))
+        elif row['status'] == 'skipped':
+            print(f"⏭️  Skipping {replay_name} - {row['note']}")
+        else:
+            precheck_errors += 1
+            print(f"⚠️  {replay_name}: {row['note']}")
+
+    if not todo_args:
         print("No reports to generate.")
         return
-    
-    print(f"Found {len(process_args)} reports to generate")
-    
+
+    print(f"Found {len(todo_args)} reports to generate")
+
     if parallel:
-        # 并行处理
-        print(f"🚀 Processing {len(process_args)} reports in parallel...")
-        with Pool(processes=workers) as pool:
-            results = pool.map(generate_single_report, process_args)
+        # 并行处理：imap_unordered 让慢报告不阻塞快报告，chunksize 摊薄每任务的 pickle 开销
+        print(f"🚀 Processing {len(todo_args)} reports in parallel...")
+        chunksize = max(1, len(todo_args) // (workers * 4))
+        with _MP_CTX.Pool(processes=workers, initializer=_init_worker, initargs=(parent_dir,)) as pool:
+            results = list(pool.imap_unordered(run_report, todo_args, chunksize=chunksize))
     else:
         # 串行处理
-        print(f"🔄 Processing {len(process_args)} reports sequentially...")
+        print(f"🔄 Processing {len(todo_args)} reports sequentially...")
+        _init_worker(parent_dir)
         results = []
-        for i, args in enumerate(process_args, 1):
-            print(f"[{i}/{len(process_args)}] 🔄 Processing {os.path.basename(args[0])}")
-            result = generate_single_report(args)
-            results.append(result)
-    
+        for i, args in enumerate(todo_args, 1):
+            print(f"[{i}/{len(todo_args)}] 🔄 Processing {args[0]}")
+            results.append(run_report(args))
+
     # 统计结果
-    success_count = sum(1 for r in results if r['status'] == 'success')
-    error_count = sum(1 for r in results if r['status'] == 'error')
-    
+    success_count = sum(1 for r in results if r['status'] == 'processed')
+    error_count = sum(1 for r in results if r['status'] == 'error') + precheck_errors
+
     print(f"\nHTML report generation completed:")
     print(f"  - Success: {success_count}")
     print(f"  - Errors: {error_count}")
-    print(f"  - Total: {len(process_args)}")
-
-
-def generate_single_report(args):
-    """
-    生成单个HTML报告的函数，用于并行处理
-    """
-    replay_folder, record_path, report_path = args
-    
-    try:
-        result = generate_html_report(record_path, replay_folder, report_path)
-        return {
-            'status': 'success',
-            'replay_folder': os.path.basename(replay_folder),
-            'report_path': os.path.basename(report_path),
-            'result': result
-        }
-    except Exception as e:
-        return {
-            'status': 'error',
-            'replay_folder': os.path.basename(replay_folder),
-            'report_path': os.path.basename(report_path),
-            'error': str(e)
-        }
+    print(f"  - Total: {len(todo_args)}")
 
 
 if __name__ == "__main__":
@@ -7,19 +7,28 @@ import os
 import sys
 import csv
 import time
+import asyncio
+import functools
 import logging
 import argparse
 import subprocess
 import signal
-import glob
 import re
 import shutil
 from pathlib import Path
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict
 from queue import Queue
 import threading
 
+# record 输出目录名的解析正则（suffix 贪婪匹配到最后一个 _run，与目录命名约定一致）
+RECORD_RUN_RE = re.compile(r'^record_output_(.+)_run(\d+)$')
+
+# sanitize_suffix 的 ASCII 转换表：字母数字和 _- 保留，其余（含 '.'）归一成 '_'；
+# translate 在 C 层一次完成，替代逐字符的 Python 循环
+SUFFIX_TABLE = {c: c if chr(c).isalnum() or chr(c) in '_-' else ord('_') for c in range(128)}
+
 # 日志配置
 logging.basicConfig(
     level=logging.INFO,
@@ -49,6 +58,12 @@ class DroidBotRunner:
         self.base_port = 5554
         self.port_step = 2
         
+        # 超时半成品目录的异步删除：先 rename 再丢给后台 janitor 线程 rmtree，
+        # 超时路径立即返回，不让大目录的删除占着模拟器
+        self._trash_queue = Queue()
+        self._janitor_thread = threading.Thread(target=self._janitor, daemon=True)
+        self._janitor_thread.start()
+
         self._setup_environment()
         os.makedirs(self.log_dir, exist_ok=True)
     
@@ -74,38 +89,47 @@ class DroidBotRunner:
         ]
         os.environ['PATH'] = ':'.join(paths) + ':' + os.environ.get('PATH', '')
     
-    def sanitize_suffix(self, apk_path: str) -> str:
-        """生成安全的目录名"""
-        s = os.path.basename(apk_path)
-        s = os.path.splitext(s)[0]
-        s = ''.join(c if c.isalnum() or c in '._-' else '_' for c in s)
-        s = s.replace('.', '_').rstrip('_')
+    @staticmethod
+    def _resolve_apk(apk_rel: str, base: str) -> str:
+        """CSV 里的相对路径挂到 apk_base 下，绝对路径原样返回"""
+        return apk_rel if apk_rel.startswith('/') else os.path.join(base, apk_rel)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def sanitize_suffix(apk_path: str) -> str:
+        """生成安全的目录名（同一 APK 会在多个生成循环里反复出现，结果记忆化）"""
+        s = os.path.splitext(os.path.basename(apk_path))[0]
+        if s.isascii():
+            s = s.translate(SUFFIX_TABLE)
+        else:
+            # 罕见的非 ASCII 名字走原来的逐字符路径，行为保持一致
+            s = ''.join(c if c.isalnum() or c in '._-' else '_' for c in s)
+            s = s.replace('.', '_')
+        s = s.rstrip('_')
         return s if s else 'apk'
     
     def read_csv_apks(self, csv_file: str) -> List[str]:
         """读取 CSV 第7列"""
-        apks = []
-        with open(csv_file, 'r', encoding='utf-8') as f:
+        skip_rows = 1 if self.mode == 'replay_new' else 2
+        # 流式读取：不再 list(reader) 整表进内存再切片；
+        # newline='' 是 csv 模块文档要求的打开方式，跳过 universal-newlines 转换
+        with open(csv_file, 'r', newline='', encoding='utf-8') as f:
             reader = csv.reader(f)
-            rows = list(reader)
-        
-        if self.mode == 'replay_new':
-            start_row = 1
-        else:
-            start_row = 2
-        
-        for row in rows[start_row:]:
-            if len(row) > 6 and row[6].strip():
-                apks.append(row[6].strip())
+            for _ in range(skip_rows):
+                next(reader, None)
+            apks = [row[6].strip() for row in reader if len(row) > 6 and row[6].strip()]
         logger.info(f"Loaded {len(apks)} APKs from {csv_file}")
         return apks
     
-    def start_emulators_batch(self, num_emulators: int) -> bool:
-        """批量启动模拟器"""
+    def start_emulators_batch(self, num_emulators: int, start_port: int = None) -> bool:
+        """批量启动模拟器（脚本内部并发 boot）；start_port 给定时只补启指定端口段"""
+        cmd = ['./start_emulator.sh', str(num_emulators)]
+        if start_port is not None:
+            cmd.append(str(start_port))
         try:
             logger.info(f"Starting {num_emulators} emulators...")
             result = subprocess.run(
-                ['./start_emulator.sh', str(num_emulators)],
+                cmd,
                 check=True,
                 capture_output=True,
                 text=True,
@@ -123,82 +147,205 @@ class DroidBotRunner:
     def kill_emulator(self, serial: str, force: bool = True):
         """
         增强版 kill_emulator - 更可靠
-        force=True 时会强制清理,不会卡住
+        force=True 时优先走 PID 文件直接 SIGKILL（零 fork/exec），
+        确认死透才收工；PID 不可用或进程赖着不死再回退 pkill。
+        force=False 时先礼貌地 adb emu kill
         """
         port = serial.split('-')[1]
         logger.info(f"Killing emulator {serial}...")
-        
-        try:
-            # 方法1: adb kill (设置短超时避免卡死)
-            subprocess.run(
-                ['adb', '-s', serial, 'emu', 'kill'],
-                capture_output=True,
-                timeout=3  # ← 只等3秒
-            )
-        except subprocess.TimeoutExpired:
-            logger.warning(f"adb kill timeout for {serial}, using force kill")
-        except Exception as e:
-            logger.debug(f"adb kill error: {e}")
-        
-        if force:
-            # 方法2: pkill (不会卡住)
+
+        if not force:
             try:
+                # 温和路径: adb kill (设置短超时避免卡死)
                 subprocess.run(
-                    ['pkill', '-9', '-f', f'emulator.*-port {port}'],
-                    capture_output=True,
-                    timeout=2
+                    ['adb', '-s', serial, 'emu', 'kill'],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=3  # ← 只等3秒
                 )
-            except:
-                pass
-            
-            # 方法3: 清理 PID 文件
+            except subprocess.TimeoutExpired:
+                logger.warning(f"adb kill timeout for {serial}")
+            except Exception as e:
+                logger.debug(f"adb kill error: {e}")
+
+        if force:
+            # 方法1: PID 文件 + os.kill，不用 fork adb/pkill
+            killed = False
             pid_file = f'emulator_{port}.pid'
-            if os.path.exists(pid_file):
-                try:
-                    with open(pid_file, 'r') as f:
-                        pid = f.read().strip()
-                    os.kill(int(pid), signal.SIGKILL)
-                except:
-                    pass
+            try:
+                with open(pid_file, 'r') as f:
+                    pid = int(f.read().strip())
+                os.kill(pid, signal.SIGKILL)
+                # 轮询确认退出: os.kill(pid, 0) 抛 ProcessLookupError 即已消失
+                for _ in range(20):
+                    try:
+                        os.kill(pid, 0)
+                    except ProcessLookupError:
+                        killed = True
+                        break
+                    time.sleep(0.05)
+            except (OSError, ValueError):
+                pass
+            try:
+                os.unlink(pid_file)
+            except OSError:
+                pass
+
+            if not killed:
+                # 方法2: 回退 pkill (不会卡住)
                 try:
-                    os.unlink(pid_file)
+                    subprocess.run(
+                        ['pkill', '-9', '-f', f'emulator.*-port {port}'],
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL,
+                        timeout=2
+                    )
                 except:
                     pass
-        
+
         logger.info(f"✓ Killed {serial}")
     
+    def cleanup_batch(self, serials: List[str]):
+        """
+        一次性清理一批模拟器：把 O(batch_size) 次 pkill fork/exec
+        合并成一条端口交替的正则，收尾从几十次进程创建变成一次
+        """
+        if not serials:
+            return
+        ports = '|'.join(s.split('-')[1] for s in serials)
+        logger.info(f"Cleaning up batch emulators (ports {ports})...")
+        try:
+            subprocess.run(
+                ['pkill', '-9', '-f', f'emulator.*-port ({ports})'],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=5
+            )
+        except:
+            pass
+        logger.info("✓ Batch cleanup completed")
+
+    def health_check(self, serial: str) -> bool:
+        """复用前检查模拟器是否存活（adb get-state，2 秒超时）"""
+        try:
+            result = subprocess.run(
+                ['adb', '-s', serial, 'get-state'],
+                capture_output=True,
+                text=True,
+                timeout=2
+            )
+            return result.stdout.strip() == 'device'
+        except Exception:
+            return False
+
+    def reset_emulator(self, serial: str):
+        """
+        任务间轻量复位：杀掉后台应用进程并回到桌面，模拟器本体继续复用。
+        droidbot 自己负责安装/卸载被测 APK，这里不需要 pm clear 具体包名
+        """
+        for shell_cmd in (['am', 'kill-all'], ['input', 'keyevent', 'KEYCODE_HOME']):
+            try:
+                subprocess.run(
+                    ['adb', '-s', serial, 'shell'] + shell_cmd,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=5
+                )
+            except Exception:
+                pass
+
+    def _ensure_emulators(self, num: int) -> bool:
+        """确保前 num 个端口的模拟器在线；只定点补启挂掉的端口，不动健康的"""
+        serials = [f"emulator-{self.base_port + i * self.port_step}" for i in range(num)]
+        dead = [s for s in serials if not self.health_check(s)]
+        if not dead:
+            return True
+        logger.warning(f"Emulators not responding: {', '.join(dead)} — restarting them")
+        self.cleanup_batch(dead)
+        # 每个死端口单独一次脚本调用，互相并发；脚本的 scoped 模式只清自己的端口
+        dead_ports = [int(s.split('-')[1]) for s in dead]
+        with ThreadPoolExecutor(max_workers=len(dead_ports)) as ex:
+            results = list(ex.map(lambda p: self.start_emulators_batch(1, p), dead_ports))
+        return all(results)
+
+    @staticmethod
+    def _wait_gone(serials: List[str], timeout: float = 7.0) -> bool:
+        """轮询 adb devices 直到目标 serial 全部消失；取代拍脑袋的固定 sleep"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                out = subprocess.check_output(['adb', 'devices'], text=True, timeout=3)
+            except Exception:
+                return False
+            if not any(s in out for s in serials):
+                return True
+            time.sleep(0.2)
+        return False
+
     def cleanup_all_emulators(self):
         """清理所有模拟器"""
         logger.info("Cleaning up all emulators...")
         try:
             subprocess.run(
                 ['pkill', '-9', '-f', f'emulator.*-avd {self.avd_name}'],
-                capture_output=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
                 timeout=5
             )
         except:
             pass
-        time.sleep(2)
+        # 等进程真正从 adb 上消失即可返回，通常远快于固定睡 2 秒
+        serials = [f"emulator-{self.base_port + i * self.port_step}"
+                   for i in range(self.max_parallel)]
+        self._wait_gone(serials, timeout=5)
         logger.info("✓ Cleanup completed")
     
-    def generate_tasks_record(self, apks: List[str]) -> List[Dict]:
+    def _scan_output_dirs(self):
+        """
+        扫一次 parent_dir，为任务生成建两份内存索引：
+          - existing: 已存在的目录名集合（逐个 os.path.exists → O(1) 集合查找）
+          - record_runs: {suffix: [(run_idx, record_dir), ...]}（替代逐 APK glob）
+        N 个 APK × run_count 的检查从上万次 stat/glob 变成一次 scandir
+        """
+        scan_dir = self.parent_dir or '.'
+        existing = set()
+        record_runs = defaultdict(list)
+        try:
+            with os.scandir(scan_dir) as it:
+                for entry in it:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    existing.add(entry.name)
+                    m = RECORD_RUN_RE.match(entry.name)
+                    if m:
+                        record_dir = os.path.join(self.parent_dir, entry.name) if self.parent_dir else entry.name
+                        record_runs[m.group(1)].append((int(m.group(2)), record_dir))
+        except OSError:
+            pass
+        for runs in record_runs.values():
+            runs.sort()
+        return existing, record_runs
+
+    def generate_tasks_record(self, apks: List[str], valid: Dict[str, bool] = None) -> List[Dict]:
         """生成 record 任务"""
         tasks = []
-        for apk_rel in apks:
-            apk_path = apk_rel if apk_rel.startswith('/') else os.path.join(self.apk_base, apk_rel)
-            if not os.path.exists(apk_path):
+        existing, _ = self._scan_output_dirs()
+        parent_prefix = self.parent_dir + os.sep if self.parent_dir else ''
+        for apk_path in apks:
+            if not (valid.get(apk_path) if valid is not None else os.path.exists(apk_path)):
                 logger.warning(f"APK not found: {apk_path}")
                 continue
-            
+
             suffix = self.sanitize_suffix(apk_path)
+            # run 循环里只变 run_idx，目录名前缀提到循环外
+            name_prefix = f"record_output_{suffix}_run"
             for run_idx in range(1, self.run_count + 1):
-                out_dir = f"record_output_{suffix}_run{run_idx}"
-                if self.parent_dir:
-                    out_dir = os.path.join(self.parent_dir, out_dir)
-                if os.path.exists(out_dir):
-                    logger.debug(f"Skip existing: {out_dir}")
+                out_name = f"{name_prefix}{run_idx}"
+                if out_name in existing:
+                    logger.debug(f"Skip existing: {out_name}")
                     continue
-                
+                out_dir = parent_prefix + out_name
+
                 tasks.append({
                     'apk_path': apk_path,
                     'suffix': suffix,
@@ -208,84 +355,66 @@ class DroidBotRunner:
                 })
         return tasks
     
-    def generate_tasks_replay_original(self, apks: List[str]) -> List[Dict]:
+    def generate_tasks_replay_original(self, apks: List[str], valid: Dict[str, bool] = None) -> List[Dict]:
         """生成 replay_original 任务"""
         tasks = []
-        for apk_rel in apks:
-            apk_path = apk_rel if apk_rel.startswith('/') else os.path.join(self.apk_base, apk_rel)
-            if not os.path.exists(apk_path):
+        existing, record_runs = self._scan_output_dirs()
+        parent_prefix = self.parent_dir + os.sep if self.parent_dir else ''
+        for apk_path in apks:
+            if not (valid.get(apk_path) if valid is not None else os.path.exists(apk_path)):
                 logger.warning(f"APK not found: {apk_path}")
                 continue
-            
+
             suffix = self.sanitize_suffix(apk_path)
-            search_pattern = f"record_output_{suffix}_run*"
-            if self.parent_dir:
-                search_pattern = os.path.join(self.parent_dir, search_pattern)
-            patterns = glob.glob(search_pattern)
-            
-            for pattern in patterns:
-                match = re.search(r'_run(\d+)$', pattern)
-                if match and os.path.isdir(pattern):
-                    run_idx = int(match.group(1))
-                    record_dir = pattern
-                    replay_dir = f"replay_output_{suffix}_run{run_idx}"
-                    if self.parent_dir:
-                        replay_dir = os.path.join(self.parent_dir, replay_dir)
-                    
-                    if os.path.exists(replay_dir):
-                        logger.debug(f"Skip existing: {replay_dir}")
-                        continue
-                    
-                    tasks.append({
-                        'apk_path': apk_path,
-                        'suffix': suffix,
-                        'run_idx': run_idx,
-                        'out_dir': replay_dir,
-                        'record_dir': record_dir,
-                        'policy': 'replay'
-                    })
+            name_prefix = f"replay_output_{suffix}_run"
+            for run_idx, record_dir in record_runs.get(suffix, ()):
+                replay_name = f"{name_prefix}{run_idx}"
+                if replay_name in existing:
+                    logger.debug(f"Skip existing: {replay_name}")
+                    continue
+                replay_dir = parent_prefix + replay_name
+
+                tasks.append({
+                    'apk_path': apk_path,
+                    'suffix': suffix,
+                    'run_idx': run_idx,
+                    'out_dir': replay_dir,
+                    'record_dir': record_dir,
+                    'policy': 'replay'
+                })
         return tasks
     
-    def generate_tasks_replay_new(self, apks: List[str]) -> List[Dict]:
+    def generate_tasks_replay_new(self, apks: List[str], valid: Dict[str, bool] = None) -> List[Dict]:
         """生成 replay_new 任务"""
         tasks = []
+        existing, record_runs = self._scan_output_dirs()
+        parent_prefix = self.parent_dir + os.sep if self.parent_dir else ''
         for base_index in range(len(apks) - 1, 0, -1):
-            base_apk_rel = apks[base_index]
-            base_apk = base_apk_rel if base_apk_rel.startswith('/') else os.path.join(self.apk_base, base_apk_rel)
-            if not os.path.exists(base_apk):
+            base_apk = apks[base_index]
+            if not (valid.get(base_apk) if valid is not None else os.path.exists(base_apk)):
                 continue
-            
+
             base_suffix = self.sanitize_suffix(base_apk)
-            search_pattern = f"record_output_{base_suffix}_run*"
-            if self.parent_dir:
-                search_pattern = os.path.join(self.parent_dir, search_pattern)
-            patterns = glob.glob(search_pattern)
-            
-            runs = []
-            for pattern in patterns:
-                match = re.search(r'_run(\d+)$', pattern)
-                if match and os.path.isdir(pattern):
-                    runs.append((int(match.group(1)), pattern))
-            
+            runs = record_runs.get(base_suffix)
             if not runs:
                 continue
-            
+            for_suffix = f"_for_{base_suffix}"
+
             target_apks = apks[:base_index]
-            for target_apk_rel in target_apks:
-                target_apk = target_apk_rel if target_apk_rel.startswith('/') else os.path.join(self.apk_base, target_apk_rel)
-                if not os.path.exists(target_apk):
+            for target_apk in target_apks:
+                if not (valid.get(target_apk) if valid is not None else os.path.exists(target_apk)):
                     continue
-                
+
                 target_suffix = self.sanitize_suffix(target_apk)
+                # O(N²·R) 最内层循环只变 run_idx：前后缀都在外层算好
+                name_prefix = f"replay_output_{target_suffix}_run"
                 for run_idx, record_dir in runs:
-                    replay_dir = f"replay_output_{target_suffix}_run{run_idx}_for_{base_suffix}"
-                    if self.parent_dir:
-                        replay_dir = os.path.join(self.parent_dir, replay_dir)
-                    
-                    if os.path.exists(replay_dir):
-                        logger.debug(f"Skip existing: {replay_dir}")
+                    replay_name = f"{name_prefix}{run_idx}{for_suffix}"
+                    if replay_name in existing:
+                        logger.debug(f"Skip existing: {replay_name}")
                         continue
-                    
+                    replay_dir = parent_prefix + replay_name
+
                     tasks.append({
                         'apk_path': target_apk,
                         'suffix': target_suffix,
@@ -297,10 +426,29 @@ class DroidBotRunner:
                     })
         return tasks
     
-    def run_single_task(self, task: Dict, serial: str) -> bool:
+    def _janitor(self):
+        """后台线程：逐个 rmtree 丢进来的垃圾目录，None 为退出哨兵"""
+        while True:
+            path = self._trash_queue.get()
+            if path is None:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _discard_dir(self, out_dir: str):
+        """把目录改名挪进回收队列；rename 失败（目录不存在等）就地兜底删除"""
+        trash_path = f"{out_dir}.trash.{time.time_ns()}"
+        try:
+            os.rename(out_dir, trash_path)
+        except OSError:
+            shutil.rmtree(out_dir, ignore_errors=True)
+            return
+        self._trash_queue.put(trash_path)
+
+    async def run_single_task(self, task: Dict, serial: str) -> bool:
         """
-        运行单个任务
-        关键改进: 添加了更多保护避免卡死
+        运行单个任务（协程版）
+        单线程事件循环同时等待所有模拟器子进程：没有每任务 8MB 的线程栈，
+        也没有线程池共享队列的锁竞争；droidbot 子进程本身照常并行跑
         """
         apk_path = task['apk_path']
         out_dir = task['out_dir']
@@ -333,35 +481,51 @@ class DroidBotRunner:
         try:
             if self.test_mode:
                 logger.info(f"[{serial}] TEST MODE → {out_dir}")
-                time.sleep(1)
+                await asyncio.sleep(1)
                 success = True
             else:
-                with open(log_file, 'w') as f:
-                    # ✅ 关键: 设置超时
-                    result = subprocess.run(
-                        cmd,
-                        stdout=f,
-                        stderr=subprocess.STDOUT,
-                        timeout=self.per_task_timeout
+                # 直接把裸 fd 交给子进程当 stdout：日志全程由子进程写，
+                # 不需要 Python 这层的文本包装和缓冲
+                fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        stdout=fd,
+                        stderr=subprocess.STDOUT
                     )
-                    success = (result.returncode == 0)
-        
-        except subprocess.TimeoutExpired:
+                finally:
+                    os.close(fd)
+                try:
+                    # ✅ 关键: 设置超时
+                    returncode = await asyncio.wait_for(
+                        proc.wait(), timeout=self.per_task_timeout)
+                    success = (returncode == 0)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    raise
+
+        except asyncio.TimeoutError:
             logger.error(f"[{serial}] ✗ TIMEOUT after {self.per_task_timeout}s")
-            # 清理半成品
-            shutil.rmtree(out_dir, ignore_errors=True)
+            # 清理半成品：rename 是常数时间的，真正的删除交给 janitor
+            self._discard_dir(out_dir)
             success = False
-        
+
         except Exception as e:
             logger.error(f"[{serial}] ✗ Error: {e}")
             success = False
-        
+
         finally:
-            # ✅ 关键: 无论如何都要 kill,使用 force=True
+            # 模拟器池跨批次复用：成功的任务只做轻量复位；
+            # 失败/超时的模拟器状态不可信，杀掉，由下一批前的健康检查重启。
+            # adb/pkill 是阻塞调用，丢到线程里跑，不挡事件循环
             try:
-                self.kill_emulator(serial, force=True)
+                if success:
+                    await asyncio.to_thread(self.reset_emulator, serial)
+                else:
+                    await asyncio.to_thread(self.kill_emulator, serial, True)
             except Exception as e:
-                logger.error(f"Error killing {serial}: {e}")
+                logger.error(f"Error resetting {serial}: {e}")
         
         if success:
             logger.info(f"[{serial}] ✓ Success → {out_dir}")
@@ -380,9 +544,10 @@ class DroidBotRunner:
         logger.info(f"Batch: {batch_size} tasks")
         logger.info("=" * 60)
         
-        # 启动模拟器
-        if not self.start_emulators_batch(batch_size):
-            logger.error("Failed to start emulators")
+        # 模拟器池在 run() 里启动一次；这里只确认存活，必要时重启，
+        # 省掉每批 180 秒量级的重复冷启动
+        if not self._ensure_emulators(batch_size):
+            logger.error("Failed to ensure emulators")
             return 0
         
         # ✅ 关键改进: 使用线程安全的队列分配模拟器
@@ -393,37 +558,30 @@ class DroidBotRunner:
             serial_queue.put(serial)
         
         logger.info(f"Emulators ready: {batch_size}")
-        
-        # ✅ 改进: 使用固定映射,避免竞态
-        def worker(task_and_serial):
-            task, serial = task_and_serial
-            return self.run_single_task(task, serial)
-        
+
         # 预先分配任务和模拟器的映射
         task_assignments = []
         for task in tasks:
             serial = serial_queue.get()  # 从队列取
             task_assignments.append((task, serial))
-        
+
         # 并发执行 (现在每个任务都有固定的 serial,不会冲突)
-        success_count = 0
-        with ThreadPoolExecutor(max_workers=batch_size) as executor:
-            # ✅ 使用 map 更清晰
-            results = executor.map(worker, task_assignments)
-            for success in results:
-                if success:
-                    success_count += 1
+        # 一个事件循环多路等待所有子进程，替代每任务一个阻塞线程
+        async def _run_all():
+            coros = [self.run_single_task(task, serial)
+                     for task, serial in task_assignments]
+            return await asyncio.gather(*coros, return_exceptions=True)
+
+        results = asyncio.run(_run_all())
+        for failure in results:
+            if isinstance(failure, BaseException):
+                logger.error(f"Task raised: {failure}")
+        # True == 1：sum 在 C 层累加，异常按失败计
+        success_count = sum(r is True for r in results)
         
         logger.info(f"Batch completed: {success_count}/{batch_size} successful")
         
-        # 最后确保清理
-        time.sleep(2)
-        for _, serial in task_assignments:
-            try:
-                self.kill_emulator(serial, force=True)
-            except:
-                pass
-        
+        # 模拟器留给下一批复用，统一在 run() 结束时清理
         return success_count
     
     def run(self):
@@ -444,13 +602,22 @@ class DroidBotRunner:
             logger.error("No APKs found")
             return
         
+        # 路径解析只做一次：replay_new 的嵌套循环里同一 APK 会反复出现，
+        # 生成器直接拿解析好的路径，不再逐次 join
+        apks = [self._resolve_apk(a, self.apk_base) for a in apks]
+
+        # 再用线程池把 APK 存在性检查并行化：stat 是纯 I/O 等待，
+        # APK 库在网络盘上时串行逐个 stat 会被单次延迟放大 N 倍
+        with ThreadPoolExecutor(max_workers=min(32, max(1, len(apks)))) as ex:
+            valid = dict(zip(apks, ex.map(os.path.exists, apks)))
+
         # 生成任务
         if self.mode == 'record':
-            all_tasks = self.generate_tasks_record(apks)
+            all_tasks = self.generate_tasks_record(apks, valid)
         elif self.mode == 'replay_original':
-            all_tasks = self.generate_tasks_replay_original(apks)
+            all_tasks = self.generate_tasks_replay_original(apks, valid)
         elif self.mode == 'replay_new':
-            all_tasks = self.generate_tasks_replay_new(apks)
+            all_tasks = self.generate_tasks_replay_new(apks, valid)
         else:
             logger.error(f"Unknown mode: {self.mode}")
             return
@@ -460,26 +627,37 @@ class DroidBotRunner:
             return
         
         logger.info(f"Total tasks: {len(all_tasks)}")
-        
+
+        # 模拟器池只启动一次，跨批次复用（启动占 wallclock 大头）
+        pool_size = min(self.max_parallel, len(all_tasks))
+        if not self.start_emulators_batch(pool_size):
+            logger.error("Failed to start emulator pool")
+            return
+
         # 分批执行
         total_success = 0
-        for i in range(0, len(all_tasks), self.max_parallel):
-            batch = all_tasks[i:i + self.max_parallel]
-            batch_num = i // self.max_parallel + 1
-            total_batches = (len(all_tasks) + self.max_parallel - 1) // self.max_parallel
-            
-            logger.info(f"\n{'=' * 60}")
-            logger.info(f"Batch {batch_num}/{total_batches}")
-            logger.info(f"{'=' * 60}")
-            
-            success = self.run_batch(batch)
-            total_success += success
-            
-            # 批次间休息
-            if i + self.max_parallel < len(all_tasks):
-                logger.info("Waiting 5s before next batch...")
-                time.sleep(5)
-        
+        try:
+            for i in range(0, len(all_tasks), self.max_parallel):
+                batch = all_tasks[i:i + self.max_parallel]
+                batch_num = i // self.max_parallel + 1
+                total_batches = (len(all_tasks) + self.max_parallel - 1) // self.max_parallel
+
+                logger.info(f"\n{'=' * 60}")
+                logger.info(f"Batch {batch_num}/{total_batches}")
+                logger.info(f"{'=' * 60}")
+
+                success = self.run_batch(batch)
+                total_success += success
+
+                # 模拟器池跨批次复用，批次间无需固定休息；
+                # 下一批开头的 _ensure_emulators 会做健康检查
+        finally:
+            # 程序退出时才真正拆掉模拟器池
+            self.cleanup_all_emulators()
+            # 哨兵关停 janitor，把排队的垃圾目录删完再退出
+            self._trash_queue.put(None)
+            self._janitor_thread.join(timeout=60)
+
         # 统计
         logger.info(f"\n{'=' * 60}")
         logger.info(f"{self.mode.upper()} Completed")
@@ -490,7 +668,8 @@ class DroidBotRunner:
 def signal_handler(signum, frame):
     """Ctrl+C 处理"""
     logger.warning("Interrupted! Cleaning up...")
-    subprocess.run(['pkill', '-9', 'emulator'], capture_output=True)
+    subprocess.run(['pkill', '-9', 'emulator'],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     sys.exit(1)
 
 
@@ -9,10 +9,18 @@ export PATH=$PATH:$ANDROID_HOME/emulator
 
 # ===== 配置 =====
 AVD_NAME="Android10.0"
-START_PORT=5554
 NUM_EMULATORS=${1:-16}
+# 可选第二参数: 起始端口。带上它表示"定点补启"模式，
+# 清理时只动自己的端口区间，不碰其它还健康的模拟器
+START_PORT=${2:-5554}
+SCOPED=${2:+1}
 LOG_DIR="./emulator_logs"
 MAX_RETRY=3
+# 定点补启会并发跑多个脚本实例，报告文件按起始端口区分，
+# 避免互相截断/把兄弟实例的成功算到自己头上
+REPORT_SUFFIX=${SCOPED:+_$START_PORT}
+READY_FILE="$LOG_DIR/ready_devices${REPORT_SUFFIX}.txt"
+FAILED_FILE="$LOG_DIR/failed_devices${REPORT_SUFFIX}.txt"
 
 mkdir -p "$LOG_DIR"
 
@@ -30,7 +38,9 @@ cleanup_all() {
     port=$((START_PORT + i*2))
     cleanup_device "$port"
   done
-  pkill -f "emulator.*-avd $AVD_NAME" 2>/dev/null || true
+  if [[ -z "${SCOPED:-}" ]]; then
+    pkill -f "emulator.*-avd $AVD_NAME" 2>/dev/null || true
+  fi
   if [[ "${1:-}" == "from_trap" ]]; then
     exit 0
   fi
@@ -104,7 +114,7 @@ try_boot_emulator() {
 
     if wait_for_boot "$device" 300; then
       log "[$device] 启动成功 (尝试 #$attempt)"
-      echo "$device" >> "$LOG_DIR/ready_devices.txt"
+      echo "$device" >> "$READY_FILE"
       return 0
     else
       log "[$device] 启动超时 (尝试 #$attempt)"
@@ -114,7 +124,7 @@ try_boot_emulator() {
   done
 
   log "[$device] 启动失败 (重试 $MAX_RETRY 次后)"
-  echo "$device" >> "$LOG_DIR/failed_devices.txt"
+  echo "$device" >> "$FAILED_FILE"
   return 1
 }
 
@@ -123,8 +133,8 @@ main() {
   cleanup_all || true
   sleep 2
 
-  : > "$LOG_DIR/ready_devices.txt"
-  : > "$LOG_DIR/failed_devices.txt"
+  : > "$READY_FILE"
+  : > "$FAILED_FILE"
 
   local start_time=$(date +%s)
   log "开始启动 $NUM_EMULATORS 个模拟器..."
@@ -149,20 +159,20 @@ main() {
   log "总耗时: ${total_time} 秒"
   
   local success_count
-  success_count=$(wc -l < "$LOG_DIR/ready_devices.txt" 2>/dev/null || echo 0)
+  success_count=$(wc -l < "$READY_FILE" 2>/dev/null || echo 0)
   local fail_count
-  fail_count=$(wc -l < "$LOG_DIR/failed_devices.txt" 2>/dev/null || echo 0)
+  fail_count=$(wc -l < "$FAILED_FILE" 2>/dev/null || echo 0)
   
   log "成功就绪: $success_count/$NUM_EMULATORS"
   log "失败: $fail_count/$NUM_EMULATORS"
 
   if (( success_count > 0 )); then
     echo "就绪设备："
-    cat "$LOG_DIR/ready_devices.txt"
+    cat "$READY_FILE"
   fi
   if (( fail_count > 0 )); then
     echo "失败设备："
-    cat "$LOG_DIR/failed_devices.txt"
+    cat "$FAILED_FILE"
   fi
   echo
 